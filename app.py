@@ -1,14 +1,34 @@
 import os
+import atexit
+import logging
+import logging.handlers
+import queue
 from dotenv import load_dotenv
+
+# Load .env before importing blueprints, they read config at import time
+load_dotenv()
+
 from flask import Flask, request, jsonify, session
 import bcrypt
-from database import create_user, get_user_by_email, get_user_by_id
+from database import create_user, get_user_by_email, get_user_by_id, release_db_connection
 from auth import auth_bp
 from expenses import expenses_bp
 from categories import categories_bp
+from utils import OrjsonProvider, error_response
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import timedelta
 
-load_dotenv()
+# Logging: request threads only enqueue records, a background listener
+# thread writes them to stderr
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Formatted for real by log_handler
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'), handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY')
@@ -16,6 +36,9 @@ app.secret_key = os.environ.get('SECRET_KEY')
 if not app.secret_key:
     raise ValueError("No SECRET_KEY set! Create .env file with SECRET_KEY=...")
 
+# Serialize JSON responses with orjson
+app.json = OrjsonProvider(app)
+
 # Environment
 ENV = os.environ.get('FLASK_ENV', 'development')
 
@@ -24,14 +47,24 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
+# Reject request bodies over 16KB with 413 before they are read or parsed
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024
+
 # Secure flag only in production (requires HTTPS)
 if ENV == 'production':
     app.config['SESSION_COOKIE_SECURE'] = True
 
+# Hand each request's SQLite connection back to the pool
+app.teardown_appcontext(release_db_connection)
+
 app.register_blueprint(auth_bp)
 app.register_blueprint(expenses_bp)
 app.register_blueprint(categories_bp)
 
+@app.errorhandler(RequestEntityTooLarge)
+def request_entity_too_large(e):
+    return error_response("Request body too large", 413)
+
 @app.route('/')
 def home():
     return "Expense Tracker API"
@@ -1,18 +1,51 @@
 # auth.py
 from flask import Blueprint, request, jsonify, session
 import bcrypt
+import os
 import re
 import sqlite3
+import logging
 from database import create_user, get_user_by_email, get_user_by_id
+from utils import error_response
 
 # Create a Blueprint
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
+
+# bcrypt work factor (hashing time doubles with each step)
+# Defaults to bcrypt's own default; set BCRYPT_COST=10 in .env for faster local dev
+BCRYPT_COST = int(os.environ.get('BCRYPT_COST', '12'))
+
+# Hash checked against when the email is unknown, so failed logins take the
+# same time whether or not the account exists
+DUMMY_PASSWORD_HASH = bcrypt.hashpw(b'dummy-password', bcrypt.gensalt(rounds=BCRYPT_COST))
+
+# bcrypt only uses the first 72 bytes of a password (and bcrypt>=5 raises past that)
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 
 def is_valid_email(email):
     """Basic email format validation"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_REGEX.match(email) is not None
+
+
+def normalize_email(email):
+    """Trim and lowercase an email from request JSON, '' if it isn't a string"""
+    if not isinstance(email, str):
+        return ''
+    return email.strip().lower()
+
+
+def hash_password(password_bytes):
+    """Hash a UTF-8 encoded password with bcrypt"""
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=BCRYPT_COST))
+
+
+def check_password(password_bytes, password_hash):
+    """Verify a UTF-8 encoded password against a bcrypt hash"""
+    return bcrypt.checkpw(password_bytes, password_hash)
 
 
 @auth_bp.route('/register', methods=['POST'])
@@ -26,69 +59,78 @@ def register():
         "last_name": "Doe"
     }
     """
+    if not request.is_json:
+        return error_response("Content-Type must be application/json", 400)
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict):
+        return error_response("Invalid JSON", 400)
+    
+    # Extract fields
+    email = normalize_email(data.get('email'))
+    password = data.get('password', '')
+    first_name = data.get('first_name', '')
+    last_name = data.get('last_name', '')
+
+    if not all(isinstance(field, str) for field in (password, first_name, last_name)):
+        return error_response("All fields must be strings", 400)
+
+    first_name = first_name.strip()
+    last_name = last_name.strip()
+    
+    # Validate required fields
+    if not email or not password or not first_name or not last_name:
+        return error_response("All fields are required", 400)
+    
+    # Validate email format
+    if not is_valid_email(email):
+        return error_response("Invalid email format", 400)
+    
+    # Validate password length
+    if len(password) < 8:
+        return error_response("Password must be at least 8 characters", 400)
+
+    password_bytes = password.encode('utf-8')
+
+    if len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+        return error_response(f"Password must be at most {BCRYPT_MAX_PASSWORD_BYTES} bytes", 400)
+    
+    # Validate name lengths
+    if len(first_name) > 50 or len(last_name) > 50:
+        return error_response("Names must be 50 characters or less", 400)
+    
     try:
-        if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
-        
-        data = request.json
-        
-        if data is None:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
-        # Extract fields
-        email = data.get('email', '').strip().lower()
-        password = data.get('password', '')
-        first_name = data.get('first_name', '').strip()
-        last_name = data.get('last_name', '').strip()
-        
-        # Validate required fields
-        if not email or not password or not first_name or not last_name:
-            return jsonify({"error": "All fields are required"}), 400
-        
-        # Validate email format
-        if not is_valid_email(email):
-            return jsonify({"error": "Invalid email format"}), 400
-        
-        # Validate password length
-        if len(password) < 8:
-            return jsonify({"error": "Password must be at least 8 characters"}), 400
-        
-        # Validate name lengths
-        if len(first_name) > 50 or len(last_name) > 50:
-            return jsonify({"error": "Names must be 50 characters or less"}), 400
-        
         # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        password_hash = hash_password(password_bytes)
         
         # Create user in database
         user_id = create_user(email, password_hash, first_name, last_name)
         
-        # Log the user in automatically
-        session['user_id'] = user_id
-        
-        return jsonify({
-            "message": "User registered successfully",
-            "user": {
-                "id": user_id,
-                "email": email,
-                "first_name": first_name,
-                "last_name": last_name
-            }
-        }), 201
-        
     except sqlite3.IntegrityError as e:
-        # Email already exists (UNIQUE constraint violation)
-        error_str = str(e).lower()
-        if "unique constraint" in error_str or "email" in error_str:
-            return jsonify({"error": "Email already registered"}), 409
-        else:
-            # Other integrity error
-            print(f"Registration integrity error: {e}")
-            return jsonify({"error": "Registration failed"}), 400
+        # Duplicate email is handled below, anything else is bad input
+        logger.warning("Registration integrity error: %s", e)
+        return error_response("Registration failed", 400)
     
-    except Exception as e:
-        print(f"Registration error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Registration error")
+        return error_response("Internal server error", 500)
+
+    if user_id is None:
+        return error_response("Email already registered", 409)
+    
+    # Log the user in automatically
+    session['user_id'] = user_id
+    
+    return jsonify({
+        "message": "User registered successfully",
+        "user": {
+            "id": user_id,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name
+        }
+    }), 201
 
 
 @auth_bp.route('/login', methods=['POST'])
@@ -100,53 +142,55 @@ def login():
         "password": "password123"
     }
     """
+    if not request.is_json:
+        return error_response("Content-Type must be application/json", 400)
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict):
+        return error_response("Invalid JSON", 400)
+    
+    email = normalize_email(data.get('email'))
+    password = data.get('password', '')
+    
+    if not email or not isinstance(password, str) or not password:
+        return error_response("Email and password are required", 400)
+
+    password_bytes = password.encode('utf-8')
+    
     try:
-        if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
-        
-        data = request.json
-        
-        if data is None:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
-        email = data.get('email', '').strip().lower()
-        password = data.get('password', '')
-        
-        if not email or not password:
-            return jsonify({"error": "Email and password are required"}), 400
-        
         # Get user from database
         user = get_user_by_email(email)
         
-        if not user:
-            # Generic error message (don't reveal if email exists)
-            return jsonify({"error": "Invalid email or password"}), 401
-        
-        # Verify password
-        password_matches = bcrypt.checkpw(
-            password.encode('utf-8'),
-            user['password_hash']
-        )
-        
-        if not password_matches:
-            return jsonify({"error": "Invalid email or password"}), 401
-        
-        # Create session
-        session['user_id'] = user['id']
-        
-        return jsonify({
-            "message": "Login successful",
-            "user": {
-                "id": user['id'],
-                "email": user['email'],
-                "first_name": user['first_name'],
-                "last_name": user['last_name']
-            }
-        }), 200
+        # Registration rejects longer passwords, so they can never match
+        if not user or len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+            # Dummy check so response time doesn't reveal unknown emails
+            check_password(password_bytes[:BCRYPT_MAX_PASSWORD_BYTES], DUMMY_PASSWORD_HASH)
+            password_matches = False
+        else:
+            # Verify password
+            password_matches = check_password(password_bytes, user['password_hash'])
         
-    except Exception as e:
-        print(f"Login error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Login error")
+        return error_response("Internal server error", 500)
+    
+    if not password_matches:
+        # Generic error message (don't reveal if email exists)
+        return error_response("Invalid email or password", 401)
+    
+    # Create session
+    session['user_id'] = user['id']
+    
+    return jsonify({
+        "message": "Login successful",
+        "user": {
+            "id": user['id'],
+            "email": user['email'],
+            "first_name": user['first_name'],
+            "last_name": user['last_name']
+        }
+    }), 200
 
 # should I check if user is logged in or not
 # if not logged in, send msg, "you are not logged in"
@@ -157,9 +201,9 @@ def logout():
         session.clear()
         return jsonify({"message": "Logout successful"}), 200
         
-    except Exception as e:
-        print(f"Logout error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Logout error")
+        return error_response("Internal server error", 500)
 
 
 @auth_bp.route('/me', methods=['GET'])
@@ -167,7 +211,7 @@ def get_current_user():
     """Get currently logged-in user's info"""
     try:
         if 'user_id' not in session:
-            return jsonify({"error": "Not logged in"}), 401
+            return error_response("Not logged in", 401)
         
         user_id = session['user_id']
         
@@ -177,7 +221,7 @@ def get_current_user():
         if not user:
             # Session has invalid user_id (user was deleted)
             session.clear()
-            return jsonify({"error": "User not found"}), 404
+            return error_response("User not found", 404)
         
         return jsonify({
             "user": {
@@ -189,6 +233,6 @@ def get_current_user():
             }
         }), 200
         
-    except Exception as e:
-        print(f"Get current user error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
\ No newline at end of file
+    except Exception:
+        logger.exception("Get current user error")
+        return error_response("Internal server error", 500)
\ No newline at end of file
@@ -1,12 +1,19 @@
 from flask import Blueprint, request, jsonify, session
 import sqlite3
-from database import get_system_categories, get_user_categories, create_user_category, delete_user_category
-from utils import login_required
-import heapq
-import re
+import logging
+from database import get_category_names, create_user_category, delete_user_category
+from utils import login_required, error_response
+import string
 
 # Create blueprint
 categories_bp = Blueprint('categories', __name__)
+logger = logging.getLogger(__name__)
+
+# Characters allowed in a category name: letters, numbers and spaces
+CATEGORY_NAME_CHARS = frozenset(string.ascii_letters + string.digits + ' ')
+
+# Display name -> normalized name in one pass: uppercase, spaces to underscores
+CATEGORY_NAME_TRANSLATION = str.maketrans(string.ascii_lowercase + ' ', string.ascii_uppercase + '_')
 
 @categories_bp.route('/categories', methods=['GET'])
 @login_required
@@ -17,19 +24,8 @@ def get_categories():
     user_id = session["user_id"]
     
     try:
-        try:
-            system_categories = [cat['display_name'] for cat in get_system_categories()]
-        except Exception as e:
-            print(f"Get system category error: {e}")
-            return jsonify({"error": "Internal server error"}), 500
-        
-        try:
-            user_categories = [cat['display_name'] for cat in get_user_categories(user_id)]
-        except Exception as e:
-            print(f"Get user category error: {e}")
-            return jsonify({"error": "Internal server error"}), 500
-        
-        categories = list(heapq.merge(system_categories, user_categories))
+        # System and user categories come back already sorted from one query
+        categories = get_category_names(user_id)
         
         return jsonify({
             "categories": categories,
@@ -37,9 +33,9 @@ def get_categories():
                 "total": len(categories)
             } 
         }), 200
-    except Exception as e:
-        print(f"Get categories error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Get categories error")
+        return error_response("Internal server error", 500)
     
     
 @categories_bp.route('/categories', methods=['POST'])
@@ -52,55 +48,60 @@ def post_category():
     }
     """
     user_id = session['user_id']
-    try:
-        if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
 
-        data = request.json
+    if not request.is_json:
+        return error_response("Content-Type must be application/json", 400)
 
-        if data is None:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
-        display_name = data.get('display_name', '').strip()
+    data = request.get_json(silent=True)
 
-        if not display_name:
-            return jsonify({"error": "display_name is required"}), 400
+    if not isinstance(data, dict):
+        return error_response("Invalid JSON", 400)
+    
+    display_name = data.get('display_name', '')
 
-        if len(display_name) > 100:
-            return jsonify({"error": "Category name too long (max 100 characters)"}), 400
-        
-        if not re.match(r'^[a-zA-Z0-9 ]+$', display_name):
-            return jsonify({
-                "error": "Category name can only contain letters, numbers, and spaces"
-            }), 400
+    if not isinstance(display_name, str):
+        return error_response("display_name must be a string", 400)
 
-        normalized_name = display_name.upper().replace(' ', '_')
-        
+    display_name = display_name.strip()
+
+    if not display_name:
+        return error_response("display_name is required", 400)
+
+    if len(display_name) > 100:
+        return error_response("Category name too long (max 100 characters)", 400)
+    
+    if not CATEGORY_NAME_CHARS.issuperset(display_name):
+        return error_response("Category name can only contain letters, numbers, and spaces", 400)
+
+    normalized_name = display_name.translate(CATEGORY_NAME_TRANSLATION)
+    
+    try:
         # create category in database
         category_id = create_user_category(
             user_id,
             normalized_name,
             display_name
         )
-
-
-        return jsonify({
-            "message": f"Category '{display_name}' created successfully",
-            "category": {
-                "id": category_id,
-                "name": normalized_name,
-                "display_name": display_name,
-                "type": "user"
-            }
-        }), 201
     
     except sqlite3.IntegrityError as e:
+        # Duplicate user category or a system category name, same 409 either way
+        logger.debug("Create category conflict: %s", e)
         return jsonify({
             "error": f"Category '{display_name}' already exists"
         }), 409
-    except Exception as e:
-            print(f"Create category error: {e}")
-            return jsonify({"error": "Constraint violation"}), 400
+    except Exception:
+        logger.exception("Create category error")
+        return error_response("Internal server error", 500)
+
+    return jsonify({
+        "message": f"Category '{display_name}' created successfully",
+        "category": {
+            "id": category_id,
+            "name": normalized_name,
+            "display_name": display_name,
+            "type": "user"
+        }
+    }), 201
     
     
 @categories_bp.route('/categories/<int:category_id>', methods=['DELETE'])
@@ -114,11 +115,11 @@ def delete_user_category_route(category_id):
         success = delete_user_category(category_id, user_id)
 
         if not success:
-            return jsonify({"error": "category not found"}), 404
+            return error_response("category not found", 404)
         
         return jsonify({"message": "Category deleted successfully"}), 200
-    except Exception as e:
-        print(f"Delete category error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Delete category error")
+        return error_response("Internal server error", 500)
     
 
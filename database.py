@@ -1,29 +1,186 @@
 # database.py
 import sqlite3
 import os
-from datetime import date
+import logging
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+import datetime
 import time
+from flask import g, has_app_context
 
-def get_db_connection():
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'expenses.db')
+
+# Max number of idle connections kept open for reuse across requests
+POOL_SIZE = int(os.environ.get('KAKEIBO_SQLITE_POOL_SIZE', '5'))
+
+# Applied once to every new connection:
+# WAL lets readers run alongside a writer, synchronous=NORMAL skips the
+# per-commit fsync (still crash-safe in WAL mode), temp tables/indexes stay
+# in memory, the page cache is raised to ~20MB and reads go through a
+# memory map of up to 256MB shared with the OS page cache
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+# LIFO so the most recently used (warmest cache) connection is handed out first
+_connection_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+# Outside a request (scripts, init_db) each thread keeps one connection
+_thread_local = threading.local()
+_thread_connections = []
+
+def open_db_connection():
     """
-    Create a connection to the SQLite database
+    Open a new connection to the SQLite database
     
     :return: Database connection with row_factory set to sqlite3.Row
     """
-    db_path = os.path.join(os.path.dirname(__file__), 'expenses.db')
-    conn = sqlite3.connect(db_path)
+    # Pooled connections are handed to whichever thread serves the next request
+    # timeout sets busy_timeout, so writers wait for the lock instead of failing with SQLITE_BUSY
+    # cached_statements is raised above the default to keep get_user_expenses' filter/sort variants prepared
+    # isolation_level=None: sqlite3 never opens a transaction implicitly, writes go through transaction()
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False, cached_statements=256,
+                           isolation_level=None)
     conn.row_factory = sqlite3.Row  # Enable column access by name
-    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def get_db_connection():
+    """
+    Get a connection to the SQLite database
+
+    Inside a request, one pooled connection is reused for the whole request
+    and handed back to the pool by release_db_connection on teardown.
+    Outside a request (scripts, init_db) each thread reuses its own connection.
+    
+    Don't use the connection as a context manager: its __exit__ commits, which
+    would end an enclosing transaction() early. Writes go through transaction().
+    
+    :return: Database connection with row_factory set to sqlite3.Row
+    """
+    if not has_app_context():
+        conn = getattr(_thread_local, 'conn', None)
+        if conn is None:
+            conn = _thread_local.conn = open_db_connection()
+            _thread_connections.append(conn)
+        return conn
+
+    if 'db' not in g:
+        try:
+            g.db = _connection_pool.get_nowait()
+        except queue.Empty:
+            g.db = open_db_connection()
+    return g.db
+
+def release_db_connection(exception=None):
+    """
+    Return the request's connection to the pool (registered as teardown_appcontext)
+    
+    :param exception: Unhandled exception from the request, if any
+    """
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+
+    # Never hand out a connection with a half-finished transaction
+    if conn.in_transaction:
+        conn.rollback()
+
+    try:
+        _connection_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+@atexit.register
+def close_db_connections():
+    """
+    Close idle pooled and per-thread connections (runs at interpreter exit)
+
+    PRAGMA optimize refreshes planner statistics for the indexes the
+    connection's queries used, as SQLite recommends before closing.
+    """
+    connections = list(_thread_connections)
+    _thread_connections.clear()
+    while True:
+        try:
+            connections.append(_connection_pool.get_nowait())
+        except queue.Empty:
+            break
+
+    for conn in connections:
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        conn.close()
+
+def fetchall_dicts(conn, query, params=()):
+    """
+    Run a query and return all rows as dicts
+    
+    Rows are fetched as plain tuples and zipped with the column names once,
+    cheaper than building a sqlite3.Row per row and then copying it to a dict.
+    
+    :param conn: Database connection
+    :param query: SQL query
+    :param params: Query parameters
+    :return: List of row dicts
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+@contextmanager
+def transaction():
+    """
+    Run writes in one BEGIN IMMEDIATE transaction, committed once on exit
+    
+    The write lock is taken up front, so a transaction never fails halfway
+    through on lock upgrade. Write functions open one themselves; called
+    inside an outer transaction() they join it, so N writes cost one commit:
+    
+        with transaction():
+            for row in rows:
+                create_expense(user_id, **row)
+    
+    :return: Database connection (the same one get_db_connection returns)
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        # Nested: the outermost transaction() commits or rolls back
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
 def init_db():
     """
     Initialize the database with schema from schema.sql
     """
-    with get_db_connection() as conn:
-        with open('schema.sql', 'r') as f:
-            conn.executescript(f.read())
-        print("Database initialized successfully!")
+    conn = get_db_connection()
+    with open('schema.sql', 'r') as f:
+        conn.executescript(f.read())
+    print("Database initialized successfully!")
 
 # ==================== USER FUNCTIONS ====================
 
@@ -35,52 +192,84 @@ def create_user(email, password_hash, first_name, last_name):
     :param password_hash: Bcrypt hashed password
     :param first_name: User's first name
     :param last_name: User's last name
-    :return: New user ID
-    :raises sqlite3.IntegrityError: If email already exists
+    :return: New user ID, or None if the email is already registered
+    :raises sqlite3.IntegrityError: If other constraints are violated
     """
-    with get_db_connection() as conn:
-        cursor = conn.execute(
+    with transaction() as conn:
+        # Duplicate email is detected by the UNIQUE index in the same statement
+        row = conn.execute(
             """INSERT INTO users (email, password_hash, first_name, last_name)
-               VALUES (?, ?, ?, ?)""",
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(email) DO NOTHING
+               RETURNING id""",
             (email, password_hash, first_name, last_name)
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-        print(f"User created successfully with ID: {user_id}")
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        user_id = row['id']
+        logger.debug("User created successfully with ID: %s", user_id)
         return user_id
 
 def get_user_by_email(email):
     """
-    Get user by email address
+    Get user by email address, with the password hash for login
     
     :param email: Email address
-    :return: User record as dict or None if not found
+    :return: User record (id, email, password_hash, first_name, last_name)
+        as dict or None if not found
     """
-    with get_db_connection() as conn:
-        user = conn.execute(
-            "SELECT * FROM users WHERE email = ?",
-            (email,)
-        ).fetchone()
-        return dict(user) if user else None
+    conn = get_db_connection()
+    # Served by the UNIQUE(email) index, emails are stored lowercased by auth
+    user = conn.execute(
+        """SELECT id, email, password_hash, first_name, last_name
+        FROM users
+        WHERE email = ?
+        LIMIT 1""",
+        (email,)
+    ).fetchone()
+    return dict(user) if user else None
 
 def get_user_by_id(user_id):
     """
-    Get user by ID
+    Get user profile by ID, the password hash is not selected
     
     :param user_id: User ID
-    :return: User record as dict or None if not found
+    :return: User record (id, email, first_name, last_name, created_at)
+        as dict or None if not found
     """
-    with get_db_connection() as conn:
-        user = conn.execute(
-            "SELECT * FROM users WHERE id = ?",
-            (user_id,)
-        ).fetchone()
-        return dict(user) if user else None
+    conn = get_db_connection()
+    user = conn.execute(
+        """SELECT id, email, first_name, last_name, created_at
+        FROM users
+        WHERE id = ?""",
+        (user_id,)
+    ).fetchone()
+    return dict(user) if user else None
 
 # ==================== EXPENSE FUNCTIONS ====================
 
+# RETURNING clause giving the same fields as get_expense_by_id, so writes need
+# no follow-up SELECT. CAST because SQLite 3.40 hands RETURNING's REAL amount
+# back as an integer when it has no fractional part
+EXPENSE_RETURNING = """
+    RETURNING
+        id,
+        user_id,
+        CAST(amount AS REAL) as amount,
+        type,
+        system_category_id,
+        user_category_id,
+        description,
+        date,
+        created_at,
+        (SELECT sc.display_name FROM system_categories sc WHERE sc.id = expenses.system_category_id) as system_category_name,
+        (SELECT uc.display_name FROM user_categories uc WHERE uc.id = expenses.user_category_id) as user_category_name
+"""
+
 def create_expense(user_id, amount, expense_type, system_category_id=None, 
-                   user_category_id=None, description="", date=date.today().isoformat()):
+                   user_category_id=None, description="", date=None):
     """
     Create a new expense
     
@@ -90,26 +279,255 @@ def create_expense(user_id, amount, expense_type, system_category_id=None,
     :param system_category_id: ID from system_categories (nullable)
     :param user_category_id: ID from user_categories (nullable)
     :param description: Optional description
-    :param date: Date of expense (YYYY-MM-DD format)
-    :return: New expense ID
+    :param date: Date of expense (YYYY-MM-DD format), defaults to today
+    :return: New expense record (same fields as get_expense_by_id)
     :raises sqlite3.IntegrityError: If constraints are violated
     """
-    with get_db_connection() as conn:
-        cursor = conn.execute(
+    # Resolved per call, a default argument would be frozen at import time
+    if date is None:
+        date = datetime.date.today().isoformat()
+
+    with transaction() as conn:
+        expense = conn.execute(
             """INSERT INTO expenses 
                (user_id, amount, type, system_category_id, user_category_id, description, date)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+               VALUES (?, ?, ?, ?, ?, ?, ?)""" + EXPENSE_RETURNING,
             (user_id, amount, expense_type, system_category_id, user_category_id, description, date)
+        ).fetchone()
+        logger.debug("Expense created successfully with ID: %s", expense['id'])
+        return dict(expense)
+
+def create_expenses(user_id, expenses):
+    """
+    Create many expenses for a user in a single transaction (bulk import)
+    
+    :param user_id: ID of user creating the expenses
+    :param expenses: Iterable of dicts with keys 'amount', 'type' and optionally
+        'system_category_id', 'user_category_id', 'description', 'date'
+        (same meaning and defaults as create_expense)
+    :return: Number of expenses created
+    :raises sqlite3.IntegrityError: If any row violates a constraint, nothing is inserted
+    """
+    today = datetime.date.today().isoformat()
+    rows = [
+        (
+            user_id,
+            expense['amount'],
+            expense['type'],
+            expense.get('system_category_id'),
+            expense.get('user_category_id'),
+            expense.get('description', ""),
+            expense.get('date', today)
+        )
+        for expense in expenses
+    ]
+
+    with transaction() as conn:
+        # One statement prepared once, one commit for the whole batch
+        cursor = conn.executemany(
+            """INSERT INTO expenses 
+               (user_id, amount, type, system_category_id, user_category_id, description, date)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows
         )
-        conn.commit()
-        expense_id = cursor.lastrowid
-        print(f"Expense created successfully with ID: {expense_id}")
-        return expense_id
+        return cursor.rowcount
+
+# Expense page queries slower than this are logged, timing is skipped when unset
+SLOW_QUERY_NS = int(os.environ.get('KAKEIBO_SLOW_QUERY_MS', '0')) * 1_000_000
+
+def log_if_slow(start_ns, sort_by, order):
+    """
+    Log an expense page query that took longer than SLOW_QUERY_NS
+    
+    :param start_ns: time.perf_counter_ns() taken before the query
+    :param sort_by: Sort column of the query
+    :param order: Sort order of the query
+    """
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    if elapsed_ns > SLOW_QUERY_NS:
+        logger.warning("SLOW QUERY: sort_by=%s, order=%s, time=%.2fs", sort_by, order, elapsed_ns / 1e9)
+
+# Optional get_user_expenses filters, in parameter order
+EXPENSE_FILTERS = (
+    "e.date >= ?",
+    "e.date <= ?",
+    "e.system_category_id = ?",
+    "e.user_category_id = ?",
+    "e.type = ?",
+    "e.amount >= ?",
+    "e.amount <= ?",
+)
+
+# Same values as the CHECK constraint on expenses.type
+EXPENSE_TYPES = frozenset({'expense', 'income'})
+
+# Type filter values with a partial index (index_expenses_user_income_date_id).
+# They are inlined as SQL literals instead of bound so the planner can match it;
+# other types stay bound and share one cached query
+INDEXED_EXPENSE_TYPES = frozenset({'income'})
+
+EXPENSE_SORT_COLUMNS = {
+    'date': 'e.date',
+    'amount': 'e.amount',
+    'created_at': 'e.created_at'
+}
+
+@lru_cache(maxsize=None)
+def build_expense_queries(present, sort_by, order_direction, seek=False, inline_type=None):
+    """
+    Build the count and page queries for one get_user_expenses filter/sort combination
+
+    Cached, so each combination's SQL is built once and the identical string
+    keeps hitting the connection's prepared statement cache.
+
+    :param present: Tuple of bools, one per EXPENSE_FILTERS entry in use
+    :param sort_by: Key of EXPENSE_SORT_COLUMNS
+    :param order_direction: 'ASC' or 'DESC'
+    :param seek: Page query starts after a (sort value, id) cursor, taking two
+        extra parameters before LIMIT/OFFSET
+    :param inline_type: One of INDEXED_EXPENSE_TYPES written into the SQL in
+        place of the type filter (whose present entry is then False)
+    :return: (count_query, data_query)
+    :raises ValueError: If sort_by, order_direction or inline_type is not allowed
+    """
+    # All three end up in the SQL text, checked here once per cached combination
+    if sort_by not in EXPENSE_SORT_COLUMNS:
+        raise ValueError(f"Invalid sort_by: {sort_by!r}")
+    if order_direction not in ('ASC', 'DESC'):
+        raise ValueError(f"Invalid order: {order_direction!r}")
+    if inline_type is not None and inline_type not in INDEXED_EXPENSE_TYPES:
+        raise ValueError(f"Invalid inline_type: {inline_type!r}")
+
+    where_conditions = ["e.user_id = ?"]
+    where_conditions.extend(
+        condition for condition, is_set in zip(EXPENSE_FILTERS, present) if is_set
+    )
+    if inline_type is not None:
+        where_conditions.append(f"e.type = '{inline_type}'")
+    where_clause = " AND ".join(where_conditions)
+    sort_column = EXPENSE_SORT_COLUMNS[sort_by]
+
+    # Keyset pagination: the (sort column, id) index seeks straight to the
+    # cursor instead of stepping over OFFSET rows. The count ignores the cursor
+    page_where_clause = where_clause
+    if seek:
+        operator = "<" if order_direction == "DESC" else ">"
+        page_where_clause += f" AND ({sort_column}, e.id) {operator} (?, ?)"
+
+    # Totals cover the whole filtered set, not just the page
+    count_query = f"""
+        SELECT
+            COUNT(*) as total,
+            TOTAL(CASE WHEN e.type = 'expense' THEN e.amount END) as total_expenses,
+            TOTAL(CASE WHEN e.type = 'income' THEN e.amount END) as total_income
+        FROM expenses e
+        WHERE {where_clause}
+    """
+
+    order_by_clause = f"{sort_column} {order_direction}, e.id {order_direction}"
+
+    # Query filters first, then joins
+    data_query = f"""
+        SELECT 
+            e.id,
+            e.user_id,
+            e.amount,
+            e.type,
+            e.system_category_id,
+            e.user_category_id,
+            e.description,
+            e.date,
+            e.created_at,
+            sc.display_name as system_category_name,
+            uc.display_name as user_category_name
+        FROM expenses e
+        LEFT JOIN system_categories sc ON e.system_category_id = sc.id
+        LEFT JOIN user_categories uc ON e.user_category_id = uc.id
+        WHERE {page_where_clause}
+        ORDER BY {order_by_clause}
+        LIMIT ? OFFSET ?
+    """
+
+    return count_query, data_query
+
+def expense_filter_params(user_id, start_date, end_date, system_category_id,
+                          user_category_id, expense_type, min_amount, max_amount):
+    """
+    Work out which get_user_expenses filters are set and their bound parameters
+    
+    :return: (present, inline_type, params), the build_expense_queries key
+        parts and the values for its WHERE clause
+    """
+    # An indexed type is inlined, any other type is bound like the rest
+    inline_type = expense_type if expense_type in INDEXED_EXPENSE_TYPES else None
+
+    # Same order as EXPENSE_FILTERS
+    filter_values = (start_date, end_date, system_category_id, user_category_id,
+                     expense_type, min_amount, max_amount)
+    present = (
+        bool(start_date), bool(end_date), bool(system_category_id), bool(user_category_id),
+        bool(expense_type) and inline_type is None, min_amount is not None, max_amount is not None
+    )
+
+    params = [user_id]
+    params.extend(value for value, is_set in zip(filter_values, present) if is_set)
+    return present, inline_type, params
+
+# Aggregate ORDER BY (json_group_array(... ORDER BY ...)) needs SQLite 3.44+
+AGGREGATE_ORDER_BY = sqlite3.sqlite_version_info >= (3, 44, 0)
+
+@lru_cache(maxsize=None)
+def build_expense_json_query(present, sort_by, order_direction, seek=False, inline_type=None):
+    """
+    Wrap the build_expense_queries page query so SQLite returns the page as JSON
+    
+    The array is ordered like the page: with an aggregate ORDER BY on SQLite
+    3.44+, otherwise by relying on json_group_array taking the MATERIALIZED
+    page's rows in their ORDER BY order. SQLite doesn't document that, it is
+    what it does, and test_get_user_expenses_json_page_order checks it.
+    
+    :return: Query returning one row (expenses, count, last_sort_value, last_id),
+        the last_* columns are the page's final row as a keyset cursor
+    """
+    _, data_query = build_expense_queries(present, sort_by, order_direction, seek, inline_type)
+    # Final row of the page is the first one in the opposite order
+    reverse_direction = "ASC" if order_direction == "DESC" else "DESC"
+    aggregate_order = ""
+    if AGGREGATE_ORDER_BY:
+        aggregate_order = f" ORDER BY {sort_by} {order_direction}, id {order_direction}"
+    return f"""
+        WITH page AS MATERIALIZED ({data_query}),
+        last_row AS (
+            SELECT {sort_by} as sort_value, id
+            FROM page
+            ORDER BY {sort_by} {reverse_direction}, id {reverse_direction}
+            LIMIT 1
+        )
+        SELECT
+            json_group_array(json_object(
+                'id', id,
+                'user_id', user_id,
+                'amount', amount,
+                'type', type,
+                'system_category_id', system_category_id,
+                'user_category_id', user_category_id,
+                'description', description,
+                'date', date,
+                'created_at', created_at,
+                'system_category_name', system_category_name,
+                'user_category_name', user_category_name
+            ){aggregate_order}) as expenses,
+            COUNT(*) as count,
+            (SELECT sort_value FROM last_row) as last_sort_value,
+            (SELECT id FROM last_row) as last_id
+        FROM page
+    """
 
 def get_user_expenses(user_id, start_date=None, end_date=None, 
                       system_category_id=None, user_category_id=None, 
                       expense_type=None, page=1, per_page=20, sort_by='date', order='desc',
-                      min_amount=None, max_amount=None):
+                      min_amount=None, max_amount=None, after=None,
+                      include_total=True):
     """
     Get all expenses for a user with optional filters
     
@@ -125,99 +543,195 @@ def get_user_expenses(user_id, start_date=None, end_date=None,
     :param order_by: what order to sort by (ascending or descending) (default='desc')
     :param min_amount: Optional Minimum amount to filter by
     :param max_amount: Optional Maximum amount to filter by
-    :return: List of expense records
+    :param after: Optional (sort value, id) cursor of the last row already seen,
+        e.g. a previous result's next_cursor; replaces page as the pagination offset
+    :param include_total: Run the COUNT and sums over the whole filtered set, when
+        False they are None (e.g. cursor callers that only need next_cursor)
+    :return: Dict with the page of expense records, next_cursor (None when this
+        page is not full), and over all filtered expenses total_count,
+        total_expenses_sum and total_income_sum
     """
-    with get_db_connection() as conn:
-        # Build WHERE conditions
-        where_conditions = ["e.user_id = ?"]
-        params = [user_id]
-        
-        if start_date:
-            where_conditions.append("e.date >= ?")
-            params.append(start_date)
-        
-        if end_date:
-            where_conditions.append("e.date <= ?")
-            params.append(end_date)
-        
-        if system_category_id:
-            where_conditions.append("e.system_category_id = ?")
-            params.append(system_category_id)
-        
-        if user_category_id:
-            where_conditions.append("e.user_category_id = ?")
-            params.append(user_category_id)
-        
-        if expense_type:
-            where_conditions.append("e.type = ?")
-            params.append(expense_type)
+    present, inline_type, params = expense_filter_params(
+        user_id, start_date, end_date, system_category_id, user_category_id,
+        expense_type, min_amount, max_amount
+    )
+    count_query, data_query = build_expense_queries(
+        present, sort_by, order.upper(), after is not None, inline_type
+    )
 
-        if min_amount is not None:
-            where_conditions.append("e.amount >= ?")
-            params.append(min_amount)
-        
-        if max_amount is not None:
-            where_conditions.append("e.amount <= ?")
-            params.append(max_amount)
-        
-        
-        where_clause = " AND ".join(where_conditions)
+    conn = get_db_connection()
+    total_count = total_expenses_sum = total_income_sum = None
+    if include_total:
+        total_count, total_expenses_sum, total_income_sum = conn.execute(count_query, params).fetchone()
 
-        count_query = f"""
-            SELECT COUNT(*) as total
-            FROM expenses e
-            WHERE {where_clause}
-        """
-        total_count = conn.execute(count_query, params).fetchone()['total']
+    if after is not None:
+        params.extend(after)
+        offset = 0
+    else:
+        offset = (page-1) * per_page
+    params.extend((per_page, offset))
 
+    if SLOW_QUERY_NS:
+        start_ns = time.perf_counter_ns()
+    expenses = fetchall_dicts(conn, data_query, params)
+    if SLOW_QUERY_NS:
+        log_if_slow(start_ns, sort_by, order)
+    
+    next_cursor = None
+    if len(expenses) == per_page:
+        next_cursor = (expenses[-1][sort_by], expenses[-1]['id'])
+
+    return {
+        'expenses': expenses,
+        'total_count': total_count,
+        'total_expenses_sum': total_expenses_sum,
+        'total_income_sum': total_income_sum,
+        'next_cursor': next_cursor
+    }
+
+def get_user_expenses_json(user_id, start_date=None, end_date=None, 
+                           system_category_id=None, user_category_id=None, 
+                           expense_type=None, page=1, per_page=20, sort_by='date', order='desc',
+                           min_amount=None, max_amount=None, after=None,
+                           include_total=True):
+    """
+    Same filters and paging as get_user_expenses, but the page comes back as
+    one JSON array string built by SQLite, for writing straight into a response
+    
+    :return: Dict with expenses (JSON text), the page's row count, and the same
+        total_count, total_expenses_sum, total_income_sum and next_cursor
+    """
+    present, inline_type, params = expense_filter_params(
+        user_id, start_date, end_date, system_category_id, user_category_id,
+        expense_type, min_amount, max_amount
+    )
+    count_query, _ = build_expense_queries(present, sort_by, order.upper(), inline_type=inline_type)
+    json_query = build_expense_json_query(
+        present, sort_by, order.upper(), after is not None, inline_type
+    )
+
+    conn = get_db_connection()
+    total_count = total_expenses_sum = total_income_sum = None
+    if include_total:
+        total_count, total_expenses_sum, total_income_sum = conn.execute(count_query, params).fetchone()
+
+    if after is not None:
+        params.extend(after)
+        offset = 0
+    else:
         offset = (page-1) * per_page
+    params.extend((per_page, offset))
 
-        sort_column_map = {
-            'date': 'e.date',
-            'amount': 'e.amount',
-            'created_at': 'e.created_at'
-        }
+    if SLOW_QUERY_NS:
+        start_ns = time.perf_counter_ns()
+    page_row = conn.execute(json_query, params).fetchone()
+    if SLOW_QUERY_NS:
+        log_if_slow(start_ns, sort_by, order)
 
-        sort_column = sort_column_map[sort_by]
-        order_direction = order.upper()
+    next_cursor = None
+    if page_row['count'] == per_page:
+        next_cursor = (page_row['last_sort_value'], page_row['last_id'])
 
-        order_by_clause = f"{sort_column} {order_direction}, e.id {order_direction}"
-        
-        # Query filters first, then joins
-        data_query = f"""
-            SELECT 
-                e.id,
-                e.user_id,
-                e.amount,
-                e.type,
-                e.system_category_id,
-                e.user_category_id,
-                e.description,
-                e.date,
-                e.created_at,
-                sc.display_name as system_category_name,
-                uc.display_name as user_category_name
-            FROM expenses e
-            LEFT JOIN system_categories sc ON e.system_category_id = sc.id
-            LEFT JOIN user_categories uc ON e.user_category_id = uc.id
-            WHERE {where_clause}
-            ORDER BY {order_by_clause}
-            LIMIT ? OFFSET ?
-        """
-        
-        params = params + [per_page, offset]
+    return {
+        'expenses': page_row['expenses'],
+        'total_count': total_count,
+        'total_expenses_sum': total_expenses_sum,
+        'total_income_sum': total_income_sum,
+        'next_cursor': next_cursor,
+        'count': page_row['count']
+    }
 
-        start_time = time.time()
-        expenses = conn.execute(data_query, params).fetchall()
-        elapsed = time.time() - start_time
+def get_totals_by_category(user_id, start_date=None, end_date=None, expense_type=None):
+    """
+    Get amount totals per category for a user, aggregated in SQL
+    
+    :param user_id: User ID
+    :param start_date: Optional start date filter (YYYY-MM-DD)
+    :param end_date: Optional end date filter (YYYY-MM-DD)
+    :param expense_type: Optional type filter ('expense' or 'income')
+    :return: List of {type, system_category_id, user_category_id, category_name, total, count},
+        largest total first. Uncategorized expenses have category_name None
+    """
+    conn = get_db_connection()
+    where_conditions = ["e.user_id = ?"]
+    params = [user_id]
+
+    if start_date:
+        where_conditions.append("e.date >= ?")
+        params.append(start_date)
+
+    if end_date:
+        where_conditions.append("e.date <= ?")
+        params.append(end_date)
+
+    if expense_type:
+        where_conditions.append("e.type = ?")
+        params.append(expense_type)
+
+    where_clause = " AND ".join(where_conditions)
+
+    return fetchall_dicts(
+        conn,
+        f"""SELECT
+            e.type,
+            e.system_category_id,
+            e.user_category_id,
+            COALESCE(sc.display_name, uc.display_name) as category_name,
+            SUM(e.amount) as total,
+            COUNT(*) as count
+        FROM expenses e
+        LEFT JOIN system_categories sc ON e.system_category_id = sc.id
+        LEFT JOIN user_categories uc ON e.user_category_id = uc.id
+        WHERE {where_clause}
+        GROUP BY e.type, e.system_category_id, e.user_category_id
+        ORDER BY total DESC""",
+        params
+    )
 
-        if elapsed > 0.5:  # Log slow queries
-            print(f"SLOW QUERY: sort_by={sort_by}, order={order}, time={elapsed:.2f}s")
+def get_monthly_totals(user_id, start_date=None, end_date=None):
+    """
+    Get expense and income totals per month for a user, aggregated in SQL
     
-        return {
-            'expenses': [dict(expense) for expense in expenses],
-            'total_count': total_count
-        }
+    :param user_id: User ID
+    :param start_date: Optional start date filter (YYYY-MM-DD)
+    :param end_date: Optional end date filter (YYYY-MM-DD)
+    :return: List of {month (YYYY-MM), total_expenses, total_income, net, count}, oldest first
+    """
+    conn = get_db_connection()
+    where_conditions = ["user_id = ?"]
+    params = [user_id]
+
+    if start_date:
+        where_conditions.append("date >= ?")
+        params.append(start_date)
+
+    if end_date:
+        where_conditions.append("date <= ?")
+        params.append(end_date)
+
+    where_clause = " AND ".join(where_conditions)
+
+    return fetchall_dicts(
+        conn,
+        f"""SELECT
+            month,
+            total_expenses,
+            total_income,
+            total_income - total_expenses as net,
+            count
+        FROM (
+            SELECT
+                substr(date, 1, 7) as month,
+                TOTAL(CASE WHEN type = 'expense' THEN amount END) as total_expenses,
+                TOTAL(CASE WHEN type = 'income' THEN amount END) as total_income,
+                COUNT(*) as count
+            FROM expenses
+            WHERE {where_clause}
+            GROUP BY month
+        )
+        ORDER BY month""",
+        params
+    )
 
 def get_expense_by_id(expense_id, user_id):
     """
@@ -227,28 +741,49 @@ def get_expense_by_id(expense_id, user_id):
     :param user_id: User ID (to verify ownership)
     :return: Expense record or None if not found
     """
-    with get_db_connection() as conn:
-        expense = conn.execute(
-            """SELECT 
-                e.id,
-                e.user_id,
-                e.amount,
-                e.type,
-                e.system_category_id,
-                e.user_category_id,
-                e.description,
-                e.date,
-                e.created_at,
-                sc.display_name as system_category_name,
-                uc.display_name as user_category_name
-            FROM expenses e
-            LEFT JOIN system_categories sc ON e.system_category_id = sc.id
-            LEFT JOIN user_categories uc ON e.user_category_id = uc.id
-            WHERE e.id = ? AND e.user_id = ?""",
-            (expense_id, user_id)
-        ).fetchone()
-        
-        return dict(expense) if expense else None
+    conn = get_db_connection()
+    expense = conn.execute(
+        """SELECT 
+            e.id,
+            e.user_id,
+            e.amount,
+            e.type,
+            e.system_category_id,
+            e.user_category_id,
+            e.description,
+            e.date,
+            e.created_at,
+            sc.display_name as system_category_name,
+            uc.display_name as user_category_name
+        FROM expenses e
+        LEFT JOIN system_categories sc ON e.system_category_id = sc.id
+        LEFT JOIN user_categories uc ON e.user_category_id = uc.id
+        WHERE e.id = ? AND e.user_id = ?""",
+        (expense_id, user_id)
+    ).fetchone()
+    
+    return dict(expense) if expense else None
+
+# Columns update_expense can set, in parameter order
+UPDATE_EXPENSE_COLUMNS = (
+    "amount",
+    "type",
+    "system_category_id",
+    "user_category_id",
+    "description",
+    "date",
+)
+
+@lru_cache(maxsize=None)
+def build_update_expense_query(present):
+    """
+    Build the UPDATE for one combination of update_expense fields (cached)
+    
+    :param present: Tuple of bools, one per UPDATE_EXPENSE_COLUMNS entry being set
+    :return: UPDATE query with ownership verification, returning the updated row
+    """
+    updates = [f"{column} = ?" for column, is_set in zip(UPDATE_EXPENSE_COLUMNS, present) if is_set]
+    return f"UPDATE expenses SET {', '.join(updates)} WHERE id = ? AND user_id = ?" + EXPENSE_RETURNING
 
 def update_expense(expense_id, user_id, amount=None, expense_type=None, 
                    system_category_id=None, user_category_id=None, 
@@ -264,52 +799,29 @@ def update_expense(expense_id, user_id, amount=None, expense_type=None,
     :param user_category_id: New user category (optional)
     :param description: New description (optional)
     :param date: New date (optional)
-    :return: True if successful, False if not found
+    :return: Updated expense record (same fields as get_expense_by_id),
+        or None if not found or nothing to update
     """
-    with get_db_connection() as conn:
-        # Build UPDATE query dynamically
-        updates = []
-        params = []
-        
-        if amount is not None:
-            updates.append("amount = ?")
-            params.append(amount)
-        
-        if expense_type is not None:
-            updates.append("type = ?")
-            params.append(expense_type)
-        
-        if system_category_id is not None:
-            updates.append("system_category_id = ?")
-            params.append(system_category_id)
-        
-        if user_category_id is not None:
-            updates.append("user_category_id = ?")
-            params.append(user_category_id)
-        
-        if description is not None:
-            updates.append("description = ?")
-            params.append(description)
-        
-        if date is not None:
-            updates.append("date = ?")
-            params.append(date)
-        
-        if not updates:
-            return False
-        
+    # Same order as UPDATE_EXPENSE_COLUMNS
+    values = (amount, expense_type, system_category_id, user_category_id, description, date)
+    present = tuple(value is not None for value in values)
+
+    if not any(present):
+        return None
+
+    query = build_update_expense_query(present)
+    params = [value for value in values if value is not None]
+    params.extend([expense_id, user_id])
+
+    with transaction() as conn:
         # Execute update with ownership verification
-        query = f"UPDATE expenses SET {', '.join(updates)} WHERE id = ? AND user_id = ?"
-        params.extend([expense_id, user_id])
+        expense = conn.execute(query, params).fetchone()
         
-        result = conn.execute(query, params)
-        conn.commit()
+        if expense is None:
+            return None
         
-        if result.rowcount == 0:
-            return False
-        
-        print(f"Expense {expense_id} updated successfully")
-        return True
+        logger.debug("Expense %s updated successfully", expense_id)
+        return dict(expense)
 
 def delete_expense(expense_id, user_id):
     """
@@ -319,37 +831,59 @@ def delete_expense(expense_id, user_id):
     :param user_id: User ID (to verify ownership)
     :return: True if successful, False if not found
     """
-    with get_db_connection() as conn:
+    with transaction() as conn:
         result = conn.execute(
             "DELETE FROM expenses WHERE id = ? AND user_id = ?",
             (expense_id, user_id)
         )
-        conn.commit()
         
         if result.rowcount == 0:
             return False
         
-        print(f"Expense {expense_id} deleted successfully")
+        logger.debug("Expense %s deleted successfully", expense_id)
         return True
 
 # ==================== CATEGORY FUNCTIONS ====================
 
+# System categories are seeded by schema.sql and rarely change,
+# so cache them in-process instead of querying on every request
+SYSTEM_CATEGORIES_TTL = 300  # seconds
+_system_categories_cache = {'categories': None, 'expires_at': 0.0}
+
 def get_system_categories():
     """
-    Get all system categories
+    Get all system categories (cached for SYSTEM_CATEGORIES_TTL seconds)
+
+    Every caller gets the same cached records, so they are read-only mappings;
+    copy one with dict() to change it.
+
+    :return: Tuple of read-only system category records
+    """
+    now = time.monotonic()
+    if _system_categories_cache['categories'] is not None and now < _system_categories_cache['expires_at']:
+        return _system_categories_cache['categories']
+
+    conn = get_db_connection()
+    categories = tuple(MappingProxyType(category) for category in fetchall_dicts(
+        conn,
+        """SELECT
+            id,
+            name,
+            display_name
+        FROM system_categories
+        ORDER BY display_name"""
+    ))
 
-    :return List of system category records
+    _system_categories_cache['categories'] = categories
+    _system_categories_cache['expires_at'] = now + SYSTEM_CATEGORIES_TTL
+    return categories
+
+def clear_system_categories_cache():
+    """
+    Drop cached system categories, call after changing system_categories
     """
-    with get_db_connection() as conn:
-        categories = conn.execute(
-            """SELECT
-                id,
-                name,
-                display_name
-            FROM system_categories
-            ORDER BY display_name"""
-        ).fetchall()
-        return [dict(cat) for cat in categories]
+    _system_categories_cache['categories'] = None
+    _system_categories_cache['expires_at'] = 0.0
 
 def get_user_categories(user_id):
     """
@@ -358,20 +892,40 @@ def get_user_categories(user_id):
     :param user_id: User ID
     :return: List of user category records
     """
-    with get_db_connection() as conn:
-        categories = conn.execute(
-            """SELECT 
-                id,
-                user_id,
-                name,
-                display_name,
-                created_at
-            FROM user_categories
-            WHERE user_id = ?
-            ORDER BY display_name""",
-            (user_id,)
-        ).fetchall()
-        return [dict(cat) for cat in categories]
+    conn = get_db_connection()
+    return fetchall_dicts(
+        conn,
+        """SELECT 
+            id,
+            user_id,
+            name,
+            display_name,
+            created_at
+        FROM user_categories
+        WHERE user_id = ?
+        ORDER BY display_name""",
+        (user_id,)
+    )
+
+def get_category_names(user_id):
+    """
+    Get display names of system and user categories, for list views
+    
+    :param user_id: User ID
+    :return: List of display names sorted alphabetically
+    """
+    conn = get_db_connection()
+    # Plain tuples instead of sqlite3.Row, only one column is needed
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(
+        """SELECT display_name FROM system_categories
+        UNION ALL
+        SELECT display_name FROM user_categories WHERE user_id = ?
+        ORDER BY display_name""",
+        (user_id,)
+    )
+    return [display_name for (display_name,) in rows]
 
 def create_user_category(user_id, name, display_name):  # Rename to match other functions
     """
@@ -383,38 +937,27 @@ def create_user_category(user_id, name, display_name):  # Rename to match other
     :return: New category ID
     :raises sqlite3.IntegrityError: If category already exists
     """
-    with get_db_connection() as conn:
-        # Check if this name exists in system categories
-        system_exists = conn.execute(
-            "SELECT id FROM system_categories WHERE name = ?",
-            (name,)
-        ).fetchone()
-
-        if system_exists:
-            raise sqlite3.IntegrityError(
-                f"Category '{name}' already exists as a system category"
-            )
-        
-        # Check if user already has this category
-        user_exists = conn.execute(
-            "SELECT id FROM user_categories WHERE user_id = ? AND name = ?",
-            (user_id, name)
-        ).fetchone()
-
-        if user_exists:
-            raise sqlite3.IntegrityError(
-                f"User already has category '{name}'"
-            )
-        
-        # Create category
-        cursor = conn.execute(
-            """INSERT INTO user_categories (user_id, name, display_name)
-            VALUES (?, ?, ?)""",
-            (user_id, name, display_name)
-        )
-        conn.commit()
-        category_id = cursor.lastrowid
-        print(f"User category created successfully with ID: {category_id}")
+    with transaction() as conn:
+        # UNIQUE(user_id, name) and the user_categories_no_system_name trigger
+        # reject duplicates inside the INSERT itself, no pre-check SELECTs
+        try:
+            category_id = conn.execute(
+                """INSERT INTO user_categories (user_id, name, display_name)
+                VALUES (?, ?, ?)
+                RETURNING id""",
+                (user_id, name, display_name)
+            ).fetchone()['id']
+        except sqlite3.IntegrityError as e:
+            if e.sqlite_errorcode == sqlite3.SQLITE_CONSTRAINT_TRIGGER:
+                raise sqlite3.IntegrityError(
+                    f"Category '{name}' already exists as a system category"
+                ) from e
+            if e.sqlite_errorcode == sqlite3.SQLITE_CONSTRAINT_UNIQUE:
+                raise sqlite3.IntegrityError(
+                    f"User already has category '{name}'"
+                ) from e
+            raise
+        logger.debug("User category created successfully with ID: %s", category_id)
         return category_id        
     
 def delete_user_category(category_id, user_id):
@@ -425,18 +968,17 @@ def delete_user_category(category_id, user_id):
     :param user_id: User ID (to verify ownership)
     :return: True if successful, False if failed
     """
-    with get_db_connection() as conn:
+    with transaction() as conn:
         # Verify category exists and belongs to user
         result = conn.execute(
             "DELETE FROM user_categories WHERE id = ? AND user_id = ?",
             (category_id, user_id)
         )
-        conn.commit()
 
         if result.rowcount == 0:
-            print(f"Category {category_id} not found or doesn't belong to user {user_id}")
+            logger.debug("Category %s not found or doesn't belong to user %s", category_id, user_id)
             return False
-        print(f"User category {category_id} deleted successfully")
+        logger.debug("User category %s deleted successfully", category_id)
         return True
     
 
@@ -1,11 +1,16 @@
 # expenses.py
 from flask import Blueprint, request, jsonify, session
 import sqlite3
-import re
-from utils import login_required
+import logging
+import datetime
+import base64
+import binascii
+import orjson
+from utils import login_required, error_response, raw_json_response
 from database import (
+    EXPENSE_TYPES,
     create_expense,
-    get_user_expenses,
+    get_user_expenses_json,
     get_expense_by_id,
     update_expense,
     delete_expense
@@ -16,6 +21,49 @@ ALLOWED_SORT_FIELDS = ['date', 'amount', 'created_at']
 ALLOWED_SORT_ORDERS = ['asc', 'desc']
 
 expenses_bp = Blueprint('expenses', __name__)
+logger = logging.getLogger(__name__)
+
+
+def is_valid_date(date):
+    """
+    Check for a real calendar date in YYYY-MM-DD format
+    
+    The shape is checked first since fromisoformat also accepts other ISO forms
+    (20260115, 2026-W03-4); fromisoformat then rejects dates like 2026-13-40.
+    """
+    if not isinstance(date, str) or len(date) != 10 or date[4] != '-' or date[7] != '-':
+        return False
+    try:
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        return False
+    return True
+
+
+def encode_cursor(cursor, sort_by, order):
+    """
+    Encode a (sort value, id) keyset cursor as an opaque URL-safe token
+    
+    The sort it was taken under is part of the token, so it can't be replayed
+    against a different sort column or direction.
+    """
+    value, expense_id = cursor
+    return base64.urlsafe_b64encode(orjson.dumps([sort_by, order, value, expense_id])).decode('ascii')
+
+
+def decode_cursor(token):
+    """
+    Decode a token from encode_cursor
+    
+    :return: (sort_by, order, (sort value, id)) or None if the token is malformed
+    """
+    try:
+        sort_by, order, value, expense_id = orjson.loads(base64.urlsafe_b64decode(token))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if type(expense_id) is not int or not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        return None
+    return sort_by, order, (value, expense_id)
 
 
 @expenses_bp.route('/expenses', methods=['POST'])
@@ -33,63 +81,64 @@ def create_new_expense():
     }
     """
     user_id = session['user_id']
+
+    if not request.is_json:
+        return error_response("Content-Type must be application/json", 400)
+
+    # Parsed outside the try so an oversized body surfaces as 413, not 500
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, dict):
+        return error_response("Invalid JSON", 400)
     
     try:
-        if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
-        
-        data = request.json
-        
-        if data is None:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
         # Extract and validate required fields
         amount = data.get('amount')
         expense_type = data.get('type')
         date = data.get('date')
         
         if not amount or not expense_type or not date:
-            return jsonify({"error": "amount, type, and date are required"}), 400
+            return error_response("amount, type, and date are required", 400)
+        
+        # Cheapest checks first: category constraint, type, date shape, then float parsing
+        system_category_id = data.get('system_category_id')
+        user_category_id = data.get('user_category_id')
+        
+        # Validate category constraints (at most one category)
+        if system_category_id and user_category_id:
+            return error_response("Cannot set both system and user category", 400)
+        
+        # Validate type
+        # str check first, JSON lists/objects are unhashable
+        if not isinstance(expense_type, str) or expense_type not in EXPENSE_TYPES:
+            return error_response("Type must be 'expense' or 'income'", 400)
+        
+        # Validate date format
+        if not is_valid_date(date):
+            return error_response("Date must be in YYYY-MM-DD format", 400)
         
         # Validate amount
         try:
             amount = float(amount)
             if amount <= 0:
-                return jsonify({"error": "Amount must be greater than 0"}), 400
+                return error_response("Amount must be greater than 0", 400)
         except (ValueError, TypeError):
-            return jsonify({"error": "Invalid amount format"}), 400
-        
-        # Validate type
-        if expense_type not in ['expense', 'income']:
-            return jsonify({"error": "Type must be 'expense' or 'income'"}), 400
-        
-        # Validate date format (basic check)
-        if not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
-            return jsonify({"error": "Date must be in YYYY-MM-DD format"}), 400
+            return error_response("Invalid amount format", 400)
         
         # Extract optional fields
-        system_category_id = data.get('system_category_id')
-        user_category_id = data.get('user_category_id')
-        description = data.get('description', '').strip()
+        description = (data.get('description') or '').strip() or None
         
-        # Validate category constraints (at most one category)
-        if system_category_id and user_category_id:
-            return jsonify({"error": "Cannot set both system and user category"}), 400
-        
-        # Create expense in database
-        expense_id = create_expense(
+        # Create expense in database, the new row comes back complete
+        expense = create_expense(
             user_id=user_id,
             amount=amount,
             expense_type=expense_type,
             system_category_id=system_category_id,
             user_category_id=user_category_id,
-            description=description if description else None,
+            description=description,
             date=date
         )
         
-        # Fetch the created expense to return complete info
-        expense = get_expense_by_id(expense_id, user_id)
-        
         return jsonify({
             "message": "Expense created successfully",
             "expense": expense
@@ -101,22 +150,22 @@ def create_new_expense():
         
         if "check constraint" in error_str:
             if "amount" in error_str:
-                return jsonify({"error": "Amount must be greater than 0"}), 400
+                return error_response("Amount must be greater than 0", 400)
             elif "type" in error_str:
-                return jsonify({"error": "Type must be 'expense' or 'income'"}), 400
+                return error_response("Type must be 'expense' or 'income'", 400)
             else:
-                return jsonify({"error": "Invalid expense data"}), 400
+                return error_response("Invalid expense data", 400)
         
         elif "foreign key constraint" in error_str:
-            return jsonify({"error": "Invalid category ID"}), 400
+            return error_response("Invalid category ID", 400)
         
         else:
-            print(f"Create expense integrity error: {e}")
-            return jsonify({"error": "Constraint violation"}), 400
+            logger.warning("Create expense integrity error: %s", e)
+            return error_response("Constraint violation", 400)
     
-    except Exception as e:
-        print(f"Create expense error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Create expense error")
+        return error_response("Internal server error", 500)
 
 
 @expenses_bp.route('/expenses', methods=['GET'])
@@ -125,7 +174,10 @@ def list_expenses():
     """
     Get all expenses for logged-in user with optional filters
     Query parameters:
-        - page: Page number (default: 1, min: 1)
+        - cursor: pagination.next_cursor of the previous response (preferred
+          over page, each page costs the same however deep it is), sent with
+          the same sort_by and order_by or the request is rejected with 400
+        - page: Page number (default: 1, min: 1), ignored when cursor is given
         - per_page: Items per page (default: 20, min: 1, max: 100)
         - sort_by: Sort field ('date', 'amount', 'created_at'), default: 'date'
         - order: Sort order ('asc', 'desc'), default: 'desc'
@@ -140,6 +192,7 @@ def list_expenses():
     Example:
         GET /expenses?sort_by=amount&order=desc&page=1&per_page=20&min_amount=100&max_amount=500
         GET /expenses?sort_by=date&order=asc&type=expense
+        GET /expenses?sort_by=amount&cursor=<pagination.next_cursor>
     """
     user_id = session['user_id']
     
@@ -162,6 +215,17 @@ def list_expenses():
         if order_by not in ALLOWED_SORT_ORDERS:
             order_by = 'desc'
 
+        # Keyset cursor, only valid under the sort it was issued for
+        after = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            decoded = decode_cursor(cursor)
+            if decoded is None:
+                return error_response("Invalid cursor", 400)
+            cursor_sort_by, cursor_order_by, after = decoded
+            if cursor_sort_by != sort_by or cursor_order_by != order_by:
+                return error_response("Cursor does not match sort_by and order_by", 400)
+
         # Get query parameters (filters)
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
@@ -172,33 +236,33 @@ def list_expenses():
         max_amount = request.args.get('max_amount', type=float)
         
         # Validate type if provided
-        if expense_type and expense_type not in ['expense', 'income']:
-            return jsonify({"error": "Type must be 'expense' or 'income'"}), 400
+        if expense_type and expense_type not in EXPENSE_TYPES:
+            return error_response("Type must be 'expense' or 'income'", 400)
         
         # Convert category IDs to int if provided
         if system_category_id:
             try:
                 system_category_id = int(system_category_id)
             except ValueError:
-                return jsonify({"error": "Invalid system_category_id"}), 400
+                return error_response("Invalid system_category_id", 400)
         
         if user_category_id:
             try:
                 user_category_id = int(user_category_id)
             except ValueError:
-                return jsonify({"error": "Invalid user_category_id"}), 400
+                return error_response("Invalid user_category_id", 400)
             
         if min_amount is not None and min_amount < 0:
-            return jsonify({"error": "min_amount must be non-negative"}), 400
+            return error_response("min_amount must be non-negative", 400)
         
         if max_amount is not None and max_amount < 0:
-            return jsonify({"error": "max_amount must be non-negative"}), 400
+            return error_response("max_amount must be non-negative", 400)
 
         if min_amount is not None and max_amount is not None and min_amount > max_amount:
-            return jsonify({"error": "min_amount cannot be greater than max_amount"}), 400
+            return error_response("min_amount cannot be greater than max_amount", 400)
         
-        # Get expenses from database
-        result = get_user_expenses(
+        # Get expenses from database, the page arrives already encoded as JSON
+        result = get_user_expenses_json(
             user_id=user_id,
             start_date=start_date,
             end_date=end_date,
@@ -210,43 +274,55 @@ def list_expenses():
             sort_by=sort_by,
             order=order_by,
             min_amount=min_amount,
-            max_amount=max_amount
+            max_amount=max_amount,
+            after=after
         )
 
-        expenses = result['expenses']
         total_count = result['total_count']
 
         total_pages = (total_count + per_page - 1) // per_page
 
-        has_previous = page > 1
-        has_next = page < total_pages
-        
-        # Calculate summary statistics
-        total_expenses = sum(e['amount'] for e in expenses if e['type'] == 'expense')
-        total_income = sum(e['amount'] for e in expenses if e['type'] == 'income')
+        if after is None:
+            has_previous = page > 1
+            has_next = page < total_pages
+        else:
+            # Position is unknown with a cursor, a full page may have more after it
+            page = None
+            has_previous = True
+            has_next = result['next_cursor'] is not None
+
+        # The COUNT and the page are separate reads, a row deleted in between leaves
+        # has_next set on a short page that has no cursor
+        next_cursor = None
+        if has_next and result['next_cursor'] is not None:
+            next_cursor = encode_cursor(result['next_cursor'], sort_by, order_by)
+        
+        # Summary statistics cover every expense matching the filters, not just this page
+        total_expenses = result['total_expenses_sum']
+        total_income = result['total_income_sum']
         net = total_income - total_expenses
         
-        return jsonify({
-            "expenses": expenses,
+        return raw_json_response({"expenses": result['expenses']}, {
             "pagination": {
                 "page": page,
                 "per_page": per_page,
                 "total_items": total_count,
                 "total_pages": total_pages,
                 "has_previous": has_previous,
-                "has_next": has_next 
+                "has_next": has_next,
+                "next_cursor": next_cursor
             },
             "summary": {
-                "count": len(expenses),
+                "count": result['count'],
                 "total_expenses": total_expenses,
                 "total_income": total_income,
                 "net": net
             }
-        }), 200
+        }, 200)
         
-    except Exception as e:
-        print(f"List expenses error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("List expenses error")
+        return error_response("Internal server error", 500)
 
 
 @expenses_bp.route('/expenses/<int:expense_id>', methods=['GET'])
@@ -259,13 +335,13 @@ def get_expense(expense_id):
         expense = get_expense_by_id(expense_id, user_id)
         
         if not expense:
-            return jsonify({"error": "Expense not found"}), 404
+            return error_response("Expense not found", 404)
         
         return jsonify({"expense": expense}), 200
         
-    except Exception as e:
-        print(f"Get expense error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Get expense error")
+        return error_response("Internal server error", 500)
 
 
 @expenses_bp.route('/expenses/<int:expense_id>', methods=['PUT'])
@@ -283,16 +359,17 @@ def update_expense_route(expense_id):
     }
     """
     user_id = session['user_id']
+
+    if not request.is_json:
+        return error_response("Content-Type must be application/json", 400)
+
+    # Parsed outside the try so an oversized body surfaces as 413, not 500
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, dict):
+        return error_response("Invalid JSON", 400)
     
     try:
-        if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
-        
-        data = request.json
-        
-        if data is None:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
         # Extract fields (all optional for update)
         amount = data.get('amount')
         expense_type = data.get('type')
@@ -301,30 +378,30 @@ def update_expense_route(expense_id):
         description = data.get('description')
         date = data.get('date')
         
-        # Validate amount if provided
-        if amount is not None:
-            try:
-                amount = float(amount)
-                if amount <= 0:
-                    return jsonify({"error": "Amount must be greater than 0"}), 400
-            except (ValueError, TypeError):
-                return jsonify({"error": "Invalid amount format"}), 400
+        # Cheapest checks first: category constraint, type, date shape, then float parsing
+        if system_category_id and user_category_id:
+            return error_response("Cannot set both system and user category", 400)
         
         # Validate type if provided
-        if expense_type and expense_type not in ['expense', 'income']:
-            return jsonify({"error": "Type must be 'expense' or 'income'"}), 400
+        if expense_type and (not isinstance(expense_type, str) or expense_type not in EXPENSE_TYPES):
+            return error_response("Type must be 'expense' or 'income'", 400)
         
         # Validate date format if provided
         if date:
-            if not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
-                return jsonify({"error": "Date must be in YYYY-MM-DD format"}), 400
+            if not is_valid_date(date):
+                return error_response("Date must be in YYYY-MM-DD format", 400)
         
-        # Validate category constraint
-        if system_category_id and user_category_id:
-            return jsonify({"error": "Cannot set both system and user category"}), 400
+        # Validate amount if provided
+        if amount is not None:
+            try:
+                amount = float(amount)
+                if amount <= 0:
+                    return error_response("Amount must be greater than 0", 400)
+            except (ValueError, TypeError):
+                return error_response("Invalid amount format", 400)
         
-        # Update expense
-        success = update_expense(
+        # Update expense, the updated row comes back complete
+        expense = update_expense(
             expense_id=expense_id,
             user_id=user_id,
             amount=amount,
@@ -335,11 +412,8 @@ def update_expense_route(expense_id):
             date=date
         )
         
-        if not success:
-            return jsonify({"error": "Expense not found or update failed"}), 404
-        
-        # Fetch updated expense
-        expense = get_expense_by_id(expense_id, user_id)
+        if not expense:
+            return error_response("Expense not found or update failed", 404)
         
         return jsonify({
             "message": "Expense updated successfully",
@@ -352,22 +426,22 @@ def update_expense_route(expense_id):
         
         if "check constraint" in error_str:
             if "amount" in error_str:
-                return jsonify({"error": "Amount must be greater than 0"}), 400
+                return error_response("Amount must be greater than 0", 400)
             elif "type" in error_str:
-                return jsonify({"error": "Type must be 'expense' or 'income'"}), 400
+                return error_response("Type must be 'expense' or 'income'", 400)
             else:
-                return jsonify({"error": "Invalid expense data"}), 400
+                return error_response("Invalid expense data", 400)
         
         elif "foreign key constraint" in error_str:
-            return jsonify({"error": "Invalid category ID"}), 400
+            return error_response("Invalid category ID", 400)
         
         else:
-            print(f"Update expense integrity error: {e}")
-            return jsonify({"error": "Constraint violation"}), 400
+            logger.warning("Update expense integrity error: %s", e)
+            return error_response("Constraint violation", 400)
     
-    except Exception as e:
-        print(f"Update expense error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+    except Exception:
+        logger.exception("Update expense error")
+        return error_response("Internal server error", 500)
 
 
 @expenses_bp.route('/expenses/<int:expense_id>', methods=['DELETE'])
@@ -380,10 +454,10 @@ def delete_expense_route(expense_id):
         success = delete_expense(expense_id, user_id)
         
         if not success:
-            return jsonify({"error": "Expense not found"}), 404
+            return error_response("Expense not found", 404)
         
         return jsonify({"message": "Expense deleted successfully"}), 200
         
-    except Exception as e:
-        print(f"Delete expense error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
\ No newline at end of file
+    except Exception:
+        logger.exception("Delete expense error")
+        return error_response("Internal server error", 500)
\ No newline at end of file
@@ -24,13 +24,21 @@ CREATE TABLE system_categories (
 CREATE TABLE user_categories (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
-    name TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
     display_name TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(user_id, name),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- User categories can't reuse a system category name
+CREATE TRIGGER user_categories_no_system_name
+BEFORE INSERT ON user_categories
+WHEN EXISTS (SELECT 1 FROM system_categories WHERE name = NEW.name)
+BEGIN
+    SELECT RAISE(ABORT, 'Category already exists as a system category');
+END;
+
 CREATE TABLE expenses(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
@@ -73,7 +81,24 @@ INSERT INTO system_categories (name, display_name) VALUES
 
 -- Doing essential indexing for now
 -- Further indexing will be done once app basic operations are built and database queries are decided
-CREATE INDEX index_user_categories_user_id ON user_categories(user_id);
+-- users(email) and user_categories(user_id, name) are already indexed by their UNIQUE constraints,
+-- the latter also serves lookups by user_id alone
 CREATE INDEX index_expenses_user_date_id ON expenses(user_id, date DESC, id DESC);
 
+-- get_user_expenses: sort_by=amount / created_at without a temp B-tree sort (scanned backwards for DESC)
+CREATE INDEX index_expenses_user_amount_id ON expenses(user_id, amount, id);
+CREATE INDEX index_expenses_user_created_id ON expenses(user_id, created_at, id);
+
+-- get_user_expenses: system category filter with the default date ordering
+CREATE INDEX index_expenses_user_system_category_date_id ON expenses(user_id, system_category_id, date DESC, id DESC);
+
+-- get_user_expenses: type=income with the default date ordering, income is the rare type so
+-- the full date index would step over every expense row to fill a page (type is inlined as a
+-- literal so the planner can match this). type=expense matches most rows and needs no index
+CREATE INDEX index_expenses_user_income_date_id ON expenses(user_id, date DESC, id DESC) WHERE type = 'income';
+
+-- user category filter, and ON DELETE SET NULL when a user category is deleted
+-- (without it every category delete scans the whole expenses table)
+CREATE INDEX index_expenses_user_category_id ON expenses(user_category_id);
+
 
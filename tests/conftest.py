@@ -10,6 +10,22 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import app as flask_app
 import database
 
+@pytest.fixture(scope="session")
+def template_db():
+    """
+    In-memory database with the schema loaded once per test session
+    
+    test_db clones it page by page with the backup API instead of
+    re-running every CREATE statement for each test.
+    """
+    conn = sqlite3.connect(':memory:')
+    with open('schema.sql', 'r') as f:
+        conn.executescript(f.read())
+
+    yield conn
+
+    conn.close()
+
 @pytest.fixture
 def app():
     """
@@ -28,7 +44,7 @@ def client(app):
     return app.test_client()
 
 @pytest.fixture
-def test_db(monkeypatch):
+def test_db(monkeypatch, template_db):
     """
     Create in-memory test database with schema
     
@@ -40,26 +56,38 @@ def test_db(monkeypatch):
             conn = test_db
             # ... use conn to test database functions
     """
-    # Create in-memory database
-    conn = sqlite3.connect(':memory:')
+    # Create in-memory database with a copy of the schema
+    # isolation_level=None like production, transactions only come from explicit BEGINs
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    template_db.backup(conn)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    
-    # Load schema
-    with open('schema.sql', 'r') as f:
-        conn.executescript(f.read())
+    # Same per-connection PRAGMAs as production (journal_mode stays 'memory' here)
+    for pragma in database.CONNECTION_PRAGMAS:
+        conn.execute(pragma)
 
     def mock_db_connection():
         return conn
 
     monkeypatch.setattr(database, 'get_db_connection', mock_db_connection)
+    database.clear_system_categories_cache()
     
     yield conn
     
     # Cleanup (automatically happens)
     conn.close()
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def password_hash():
+    """
+    One real bcrypt hash shared by every test
+    
+    The database only stores the hash, so tests don't pay for a full-cost
+    key schedule each time. Minimum cost keeps it checkpw-compatible.
+    """
+    return bcrypt.hashpw(b"password123", bcrypt.gensalt(rounds=4))
+
+
+@pytest.fixture(scope="session")
 def sample_user():
     def _user(email="test@example.com", password="password123", first_name="John", last_name="Doe"):
         """
@@ -67,7 +95,7 @@ def sample_user():
         
         Usage in tests:
             def test_register(client, sample_user):
-                response = client.post('/register', json=sample_user)
+                response = client.post('/register', json=sample_user())
                 assert response.status_code == 201
         """
         return {
@@ -76,16 +104,16 @@ def sample_user():
             "first_name": first_name,
             "last_name": last_name
         }
+    # Stateless factory returning a fresh dict per call, so one per session is enough
     return _user
 
 
 @pytest.fixture
-def insert_test_user(test_db, sample_user):
+def insert_test_user(test_db, sample_user, password_hash):
     """
     This creates a sample test user in the DB
     """
     user = sample_user()
-    password_hash = bcrypt.hashpw(user['password'].encode(), bcrypt.gensalt())
 
     cursor = test_db.execute(
         """
@@ -136,16 +164,21 @@ def insert_test_category(test_db, insert_test_user):
         """
         fixture to create a new user category
         """
-        category_id_list = []
-        for cat in categories:
-            cursor = test_db.execute(
-                """INSERT INTO user_categories (user_id, name, display_name)
-                   VALUES (?, ?, ?)""",
-                   (insert_test_user, cat.strip().upper().replace(' ', '_'), cat.strip())
-            )
-            category_id_list.append(cursor.lastrowid)
+        rows = [(insert_test_user, cat.strip().upper().replace(' ', '_'), cat.strip()) for cat in categories]
+        test_db.executemany(
+            """INSERT INTO user_categories (user_id, name, display_name)
+               VALUES (?, ?, ?)""",
+            rows
+        )
         test_db.commit()
 
+        # executemany doesn't report row ids, look them up by name in input order
+        ids_by_name = dict(test_db.execute(
+            "SELECT name, id FROM user_categories WHERE user_id = ?",
+            (insert_test_user,)
+        ).fetchall())
+        category_id_list = [ids_by_name[name] for _, name, _ in rows]
+
         return (category_id_list, insert_test_user)
     return _insert_test_category
 
@@ -163,10 +196,9 @@ def insert_test_multiple_expenses(test_db, insert_test_user):
             INSERT INTO expenses
             (user_id, amount, type, system_category_id, user_category_id, description, date)
             VALUES (?, ?, ?, ?, ?, ?, ?)"""
-        cursor = test_db.executemany(
-            query,
-            data
-        )
+        # One explicit transaction for the whole batch
+        test_db.execute("BEGIN IMMEDIATE")
+        test_db.executemany(query, data)
         test_db.commit()
     
     return insert_test_expenses
@@ -1,9 +1,11 @@
 import pytest
-import bcrypt
 from database import *
 import sqlite3
 from datetime import date
 import time
+import json
+import database
+import types
 
 def test_database_fixture_works(test_db):
     """
@@ -22,12 +24,11 @@ def test_database_fixture_works(test_db):
     assert result is not None
     assert result['name'] == 'users'
 
-def test_create_user(test_db):
+def test_create_user(test_db, password_hash):
     """
     Test creating a user in database
     """
     email = "test@example.com"
-    password_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt())
     first_name = "John"
     last_name = "Doe"
 
@@ -44,11 +45,21 @@ def test_create_user(test_db):
     assert user['first_name'] == first_name
     assert user['last_name'] == last_name
 
-def test_get_user_by_email(test_db):
+def test_create_user_duplicate_email_returns_none(test_db, password_hash):
+    """
+    Test creating a user with an already registered email
+    """
+    create_user("test@example.com", password_hash, "John", "Doe")
+
+    user_id = create_user("test@example.com", password_hash, "Jane", "Doe")
+
+    assert user_id is None
+    assert test_db.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+def test_get_user_by_email(test_db, password_hash):
     """Test retrieving user by email"""
     # Arrange - Create a user first
     email = "test@example.com"
-    password_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt())
     user_id = create_user(email, password_hash, "John", "Doe")
     
     # Act
@@ -81,9 +92,10 @@ def test_get_user_by_id(sample_user, insert_test_user):
     assert user["first_name"] == test_user['first_name']
     assert user["last_name"] == test_user["last_name"]
     assert user["email"] == test_user["email"]
+    assert "password_hash" not in user
 
 
-def test_get_user_by_id_not_found():
+def test_get_user_by_id_not_found(test_db):
     """
     Test retreiving user by ID which does not exist
     """
@@ -101,10 +113,12 @@ def test_create_valid_expense_for_existing_user(test_db, insert_test_user):
     amount = 50
     expense_type = 'expense'
     
-    expense_id = create_expense(insert_test_user, amount, expense_type)
+    created = create_expense(insert_test_user, amount, expense_type)
+    expense_id = created["id"]
 
     assert expense_id is not None
     assert expense_id  > 0
+    assert created == get_expense_by_id(expense_id, insert_test_user)
 
     cursor = test_db.execute("SELECT * from expenses where id = ?", (expense_id,))
     expense = cursor.fetchone()
@@ -116,6 +130,22 @@ def test_create_valid_expense_for_existing_user(test_db, insert_test_user):
     assert expense["description"] == ""
 
 
+def test_create_expense_defaults_to_current_date(test_db, insert_test_user, monkeypatch):
+    """
+    Test that the default date is taken when the expense is created, not at import
+    """
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return cls(2030, 5, 17)
+
+    monkeypatch.setattr(database, "datetime", types.SimpleNamespace(date=FakeDate))
+    expense_id = create_expense(insert_test_user, 50, "expense")["id"]
+
+    expense = test_db.execute("SELECT date FROM expenses WHERE id = ?", (expense_id,)).fetchone()
+    assert expense["date"] == "2030-05-17"
+
+
 def test_create_valid_expense_for_invalid_user(test_db):
     """
     Test creating expense for an non existing user
@@ -123,9 +153,78 @@ def test_create_valid_expense_for_invalid_user(test_db):
     amount = 50
     expense_type = 'expense'
     
-    with pytest.raises(sqlite3.IntegrityError, match="FOREIGN KEY"):
+    with pytest.raises(sqlite3.IntegrityError) as excinfo:
         create_expense(10, amount, expense_type)
 
+    assert excinfo.value.sqlite_errorcode == sqlite3.SQLITE_CONSTRAINT_FOREIGNKEY
+
+
+def test_create_expenses_bulk(insert_test_user):
+    """
+    Test creating many expenses in one call
+    """
+    expenses = [{"amount": 10 + i, "type": "expense", "date": "2024-01-01"} for i in range(30)]
+    expenses.append({"amount": 500, "type": "income", "description": "salary"})
+
+    count = create_expenses(insert_test_user, expenses)
+
+    assert count == 31
+    result = get_user_expenses(insert_test_user, per_page=50)
+    assert result['total_count'] == 31
+
+
+def test_create_expenses_bulk_is_atomic(test_db, insert_test_user):
+    """
+    Test that one invalid row means none of the batch is inserted
+    """
+    expenses = [
+        {"amount": 10, "type": "expense"},
+        {"amount": -5, "type": "expense"},
+    ]
+
+    with pytest.raises(sqlite3.IntegrityError) as excinfo:
+        create_expenses(insert_test_user, expenses)
+
+    assert excinfo.value.sqlite_errorcode == sqlite3.SQLITE_CONSTRAINT_CHECK
+
+    count = test_db.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 0
+
+
+def test_transaction_rolls_back_all_writes(test_db, insert_test_user):
+    """
+    Test that writes inside transaction() are committed or rolled back together
+    """
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction():
+            create_expense(insert_test_user, 10, "expense", date="2026-01-01")
+            create_expense(insert_test_user, -5, "expense", date="2026-01-02")
+
+    count = test_db.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 0
+
+    with transaction():
+        create_expense(insert_test_user, 10, "expense", date="2026-01-01")
+        create_expense(insert_test_user, 20, "expense", date="2026-01-02")
+
+    assert not test_db.in_transaction
+    count = test_db.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 2
+
+def test_transaction_survives_reads_inside(test_db, insert_test_user):
+    """
+    Test that a read inside transaction() doesn't commit the writes before it
+    """
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction():
+            expense = create_expense(insert_test_user, 10, "expense", date="2026-01-01")
+            assert get_expense_by_id(expense["id"], insert_test_user) is not None
+            get_user_expenses(insert_test_user)
+            create_expense(insert_test_user, -5, "expense", date="2026-01-02")
+
+    count = test_db.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 0
+
 
 def test_get_expense_by_id(insert_test_expense):
     """
@@ -157,6 +256,7 @@ def test_update_expense(test_db, insert_test_expense):
     success = update_expense(expense_id, user_id, 75, "income")
 
     assert success
+    assert success == get_expense_by_id(expense_id, user_id)
 
     cursor = test_db.execute("SELECT * from expenses where id = ? and user_id = ?", (expense_id, user_id))
     expense = cursor.fetchone()
@@ -164,7 +264,7 @@ def test_update_expense(test_db, insert_test_expense):
     assert expense["amount"] == 75
     assert expense["type"] == "income"
 
-def test_update_expense_not_found(test_db, insert_test_user):
+def test_update_expense_not_found(insert_test_user):
     """
     Test for updating an non existing expense
     """
@@ -187,7 +287,7 @@ def test_delete_expense(test_db, insert_test_expense):
     assert expense is None
 
 
-def test_get_user_expenses_pagination_first_page(test_db, insert_test_user, insert_test_multiple_expenses):
+def test_get_user_expenses_pagination_first_page(insert_test_user, insert_test_multiple_expenses):
     """
     Test first page returns correct items
     """
@@ -199,7 +299,7 @@ def test_get_user_expenses_pagination_first_page(test_db, insert_test_user, inse
     assert result['total_count'] == 50
     assert result['expenses'][-1]['id'] == 31
 
-def test_get_user_expense_pagination_last_page(test_db, insert_test_user, insert_test_multiple_expenses):
+def test_get_user_expense_pagination_last_page(insert_test_user, insert_test_multiple_expenses):
     """
     Test last page returns correct items
     """
@@ -211,7 +311,7 @@ def test_get_user_expense_pagination_last_page(test_db, insert_test_user, insert
     assert result['total_count'] == 25
     assert result['expenses'][-1]['id'] == 1
 
-def test_get_user_expenses_pagination_empty_page(test_db, insert_test_user, insert_test_multiple_expenses):
+def test_get_user_expenses_pagination_empty_page(insert_test_user, insert_test_multiple_expenses):
     """Test page beyond range returns empty"""
     
     insert_test_multiple_expenses(10)
@@ -244,7 +344,7 @@ def test_get_user_expenses_pagination_with_filters(test_db, insert_test_user):
 
     assert len(result['expenses']) == 10
     assert result['total_count'] == 15
-    assert all(e['type'] == 'expense' for e in result['expenses'])
+    assert {e['type'] for e in result['expenses']} == {'expense'}
 
 
 def test_get_user_expenses_sort_by_date_desc(test_db, insert_test_user):
@@ -395,6 +495,95 @@ def test_get_user_expenses_sort_with_pagination(test_db, insert_test_user):
     assert expenses[0]['amount'] == 30
     assert expenses[-1]['amount'] == 11
 
+def test_get_user_expenses_keyset_pagination_matches_offset(test_db, insert_test_user):
+    """Test that following next_cursor returns the same pages as page numbers"""
+    # Repeated dates and amounts so the id tie-breaker matters
+    data = [(insert_test_user, i % 7 + 1, 'expense', None, None, "", f"2026-01-{i % 5 + 1:02d}") for i in range(25)]
+    test_db.executemany(
+        """INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        data
+    )
+    test_db.commit()
+
+    for sort_by, order in (('date', 'desc'), ('amount', 'asc')):
+        after = None
+        for page in range(1, 4):
+            expected = get_user_expenses(insert_test_user, page=page, per_page=10, sort_by=sort_by, order=order)
+            result = get_user_expenses(insert_test_user, per_page=10, sort_by=sort_by, order=order, after=after)
+            result_json = get_user_expenses_json(insert_test_user, per_page=10, sort_by=sort_by, order=order, after=after)
+
+            assert result['expenses'] == expected['expenses']
+            assert json.loads(result_json['expenses']) == expected['expenses']
+            assert result_json['next_cursor'] == result['next_cursor']
+            assert result['total_count'] == 25
+            after = result['next_cursor']
+
+        # Last page has 5 rows, so there is no next page
+        assert after is None
+
+def test_get_user_expenses_without_total(insert_test_user, insert_test_multiple_expenses):
+    """Test that include_total=False skips the count but returns the same page"""
+    expected = get_user_expenses(insert_test_user, page=1, per_page=10)
+    result = get_user_expenses(insert_test_user, page=1, per_page=10, include_total=False)
+
+    assert result['total_count'] is None
+    assert result['expenses'] == expected['expenses']
+
+def test_get_user_expenses_filter_by_type(test_db, insert_test_user):
+    """Test that the inlined type filter returns only rows of that type"""
+    data = [(insert_test_user, 10 + i, 'income' if i % 3 == 0 else 'expense', None, None, "", f"2026-01-{i + 1:02d}") for i in range(9)]
+    test_db.executemany(
+        """INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        data
+    )
+    test_db.commit()
+
+    income = get_user_expenses(insert_test_user, expense_type='income')
+    expense = get_user_expenses(insert_test_user, expense_type='expense')
+
+    assert income['total_count'] == 3
+    assert [e['date'] for e in income['expenses']] == ["2026-01-07", "2026-01-04", "2026-01-01"]
+    assert expense['total_count'] == 6
+    assert {e['type'] for e in expense['expenses']} == {'expense'}
+
+def test_get_user_expenses_rejects_invalid_sort(insert_test_user):
+    """Test that sort column and order never reach the SQL unchecked"""
+    with pytest.raises(ValueError):
+        get_user_expenses(insert_test_user, sort_by='amount; DROP TABLE expenses')
+
+    with pytest.raises(ValueError):
+        get_user_expenses(insert_test_user, order='desc, e.id')
+
+    # Only types with a partial index may be written into the SQL
+    with pytest.raises(ValueError):
+        build_expense_queries((False,) * len(EXPENSE_FILTERS), 'date', 'DESC', inline_type="expense' OR 1=1 --")
+
+def test_get_user_expenses_sums_cover_filtered_set(test_db, insert_test_user):
+    """Test that the expense/income sums cover all filtered rows, not one page"""
+    data = [
+        (insert_test_user, 10, 'expense', None, None, "", "2026-01-01"),
+        (insert_test_user, 20, 'expense', None, None, "", "2026-01-02"),
+        (insert_test_user, 100, 'income', None, None, "", "2026-01-03"),
+        (insert_test_user, 40, 'expense', None, None, "", "2026-02-01"),
+    ]
+    test_db.executemany(
+        """INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        data
+    )
+    test_db.commit()
+
+    for fetch in (get_user_expenses, get_user_expenses_json):
+        result = fetch(insert_test_user, per_page=1, end_date="2026-01-31")
+        assert result['total_count'] == 3
+        assert result['total_expenses_sum'] == 30
+        assert result['total_income_sum'] == 100
+
 def test_get_user_expenses_greater_than_min_amount(test_db, insert_test_user):
     """
     Test if min_amount filter works correctly
@@ -462,6 +651,116 @@ def test_get_user_expenses_more_than_min_amount_and_less_than_max_amount(test_db
 
 
 
+def test_get_user_expenses_json_matches_get_user_expenses(test_db, insert_test_user):
+    """
+    Test that the SQLite-built JSON page has the same rows, order and totals
+    """
+    data = [
+        (insert_test_user, 10.5, 'expense', 1, None, "Lunch", "2026-01-01"),
+        (insert_test_user, 100, 'income', None, None, None, "2026-01-02"),
+        (insert_test_user, 20, 'expense', None, None, "", "2026-01-03"),
+    ]
+    test_db.executemany(
+        """INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        data
+    )
+    test_db.commit()
+
+    expected = get_user_expenses(insert_test_user, page=1, per_page=2, sort_by='date', order='asc')
+    result = get_user_expenses_json(insert_test_user, page=1, per_page=2, sort_by='date', order='asc')
+
+    assert json.loads(result['expenses']) == expected['expenses']
+    assert result['total_count'] == 3
+    assert result['count'] == 2
+
+    empty = get_user_expenses_json(insert_test_user, page=5, per_page=2)
+    assert json.loads(empty['expenses']) == []
+    assert empty['count'] == 0
+
+
+@pytest.mark.parametrize("sort_by", ['date', 'amount', 'created_at'])
+@pytest.mark.parametrize("order", ['asc', 'desc'])
+def test_get_user_expenses_json_page_order(test_db, insert_test_user, sort_by, order):
+    """
+    Test that the JSON page keeps the page query's order, ties broken by id
+    """
+    # Repeated dates and amounts (created_at is the same for all) so ties need the id
+    data = [(insert_test_user, 10 * (i % 3) + 5, 'expense', None, None, "", f"2026-01-0{i % 4 + 1}") for i in range(9)]
+    test_db.executemany(
+        """INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        data
+    )
+
+    reverse = order == 'desc'
+    rows = get_user_expenses(insert_test_user, per_page=50)['expenses']
+    expected_ids = [row['id'] for row in sorted(rows, key=lambda row: (row[sort_by], row['id']), reverse=reverse)]
+
+    ids = []
+    for page in (1, 2, 3):
+        result = get_user_expenses_json(insert_test_user, page=page, per_page=4, sort_by=sort_by, order=order)
+        ids.extend(expense['id'] for expense in json.loads(result['expenses']))
+
+    assert ids == expected_ids
+
+
+def test_get_totals_by_category(test_db, insert_test_user):
+    """
+    Test per-category totals are aggregated correctly
+    """
+    data = [
+        (insert_test_user, 100, 'expense', 4, None, "", '2024-01-01'),
+        (insert_test_user, 50, 'expense', 4, None, "", '2024-01-02'),
+        (insert_test_user, 30, 'expense', None, None, "", '2024-01-03'),
+        (insert_test_user, 1000, 'income', 1, None, "", '2024-01-04'),
+    ]
+    query = """
+        INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)"""
+    test_db.executemany(query, data)
+    test_db.commit()
+
+    totals = get_totals_by_category(insert_test_user, expense_type='expense')
+
+    assert len(totals) == 2
+    assert totals[0]['system_category_id'] == 4
+    assert totals[0]['total'] == 150
+    assert totals[0]['count'] == 2
+    assert totals[1]['category_name'] is None
+    assert totals[1]['total'] == 30
+
+
+def test_get_monthly_totals(test_db, insert_test_user):
+    """
+    Test monthly totals split expenses and income per month
+    """
+    data = [
+        (insert_test_user, 100, 'expense', None, None, "", '2024-01-01'),
+        (insert_test_user, 1000, 'income', None, None, "", '2024-01-15'),
+        (insert_test_user, 40, 'expense', None, None, "", '2024-02-10'),
+    ]
+    query = """
+        INSERT INTO expenses
+        (user_id, amount, type, system_category_id, user_category_id, description, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)"""
+    test_db.executemany(query, data)
+    test_db.commit()
+
+    totals = get_monthly_totals(insert_test_user)
+
+    assert [t['month'] for t in totals] == ['2024-01', '2024-02']
+    assert totals[0]['total_expenses'] == 100
+    assert totals[0]['total_income'] == 1000
+    assert totals[0]['net'] == 900
+    assert totals[1]['total_income'] == 0
+    assert totals[1]['count'] == 1
+
+
+
 # ======================= CATEGORY TEST ==========================
 
 
@@ -474,6 +773,34 @@ def test_get_system_categories(test_db):
     assert cateogry_list is not None
 
 
+def test_get_system_categories_is_cached(test_db):
+    """
+    Test that system categories are served from cache until it is cleared
+    """
+    category_list = get_system_categories()
+
+    test_db.execute("DELETE FROM system_categories")
+    test_db.commit()
+
+    assert get_system_categories() == category_list
+
+    clear_system_categories_cache()
+    assert len(get_system_categories()) == 0
+
+
+def test_get_system_categories_are_read_only(test_db):
+    """
+    Test that callers can't change the cached system categories
+    """
+    category = get_system_categories()[0]
+    display_name = category['display_name']
+
+    with pytest.raises(TypeError):
+        category['display_name'] = 'changed'
+
+    assert get_system_categories()[0]['display_name'] == display_name
+
+
 def test_get_user_category(insert_test_category):
     """
     Test for fetching user categories of a existing user
@@ -492,6 +819,15 @@ def test_get_user_category_not_found(test_db):
     category_list = get_user_categories(10)
     assert category_list == []
 
+def test_get_category_names(insert_test_category):
+    """
+    Test for fetching only category display names
+    """
+    _, user_id = insert_test_category(["food", "anime"])
+    system_names = [cat['display_name'] for cat in get_system_categories()]
+
+    assert get_category_names(user_id) == sorted(system_names + ["food", "anime"])
+
 def test_create_user_category(test_db, insert_test_user):
     """
     Test for creating category for an existing user
@@ -525,7 +861,19 @@ def test_create_duplicate_user_category_returns_error(insert_test_category):
     with pytest.raises(sqlite3.IntegrityError, match="User already has category"):
         create_user_category(user_id, cat.upper().replace(' ', '_'), cat)
 
-def test_create_system_category_as_user_category_returns_error(test_db, insert_test_user):
+def test_create_same_user_category_for_different_users(insert_test_user, password_hash):
+    """
+    Test that two users can each have a category with the same name
+    """
+    other_user_id = create_user("other@example.com", password_hash, "Jane", "Doe")
+    cat = "anime"
+
+    cat_id = create_user_category(insert_test_user, cat.upper(), cat)
+    other_cat_id = create_user_category(other_user_id, cat.upper(), cat)
+
+    assert cat_id != other_cat_id
+
+def test_create_system_category_as_user_category_returns_error(insert_test_user):
     """
     Test for creating a system category as a user category
     """
@@ -0,0 +1,96 @@
+import pytest
+import base64
+import orjson
+from expenses import encode_cursor, decode_cursor
+
+
+def make_token(value):
+    """Encode any JSON value the way encode_cursor does, for malformed tokens"""
+    return base64.urlsafe_b64encode(orjson.dumps(value)).decode('ascii')
+
+
+# ======================= CURSOR TESTS ==========================
+
+def test_cursor_round_trip():
+    """
+    Test that a cursor decodes back to its sort and (sort value, id)
+    """
+    token = encode_cursor((12.5, 7), 'amount', 'asc')
+
+    assert decode_cursor(token) == ('amount', 'asc', (12.5, 7))
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"{not json").decode('ascii'),
+    make_token({"value": 1, "id": 2}),
+    make_token(["date", "desc", "2026-01-01"]),
+    make_token(["date", "desc", "2026-01-01", "7"]),
+    make_token(["date", "desc", True, 7]),
+    make_token(["date", "desc", None, 7]),
+    make_token(["date", "desc", "2026-01-01", True]),
+])
+def test_decode_cursor_rejects_malformed_tokens(token):
+    """
+    Test that malformed cursors decode to None instead of raising
+    """
+    assert decode_cursor(token) is None
+
+def test_list_expenses_rejects_invalid_cursor(client, test_db, insert_test_user):
+    """
+    Test that GET /expenses answers 400 for a malformed cursor
+    """
+    with client.session_transaction() as sess:
+        sess['user_id'] = insert_test_user
+
+    response = client.get('/expenses?cursor=not-a-cursor')
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+def test_list_expenses_rejects_cursor_from_other_sort(client, test_db, insert_test_multiple_expenses, insert_test_user):
+    """
+    Test that a cursor issued for one sort can't be replayed under another
+    """
+    insert_test_multiple_expenses(5)
+    with client.session_transaction() as sess:
+        sess['user_id'] = insert_test_user
+
+    first_page = client.get('/expenses?sort_by=amount&per_page=2').get_json()
+    cursor = first_page['pagination']['next_cursor']
+
+    next_page = client.get(f'/expenses?sort_by=amount&per_page=2&cursor={cursor}')
+    other_sort = client.get(f'/expenses?sort_by=date&per_page=2&cursor={cursor}')
+    other_order = client.get(f'/expenses?sort_by=amount&order_by=asc&per_page=2&cursor={cursor}')
+
+    assert next_page.status_code == 200
+    assert [e['amount'] for e in next_page.get_json()['expenses']] == [102, 101]
+    assert other_sort.status_code == 400
+    assert other_order.status_code == 400
+
+def test_list_expenses_short_page_after_concurrent_delete(client, test_db, insert_test_multiple_expenses, insert_test_user, monkeypatch):
+    """
+    Test that a row deleted between the COUNT and the page query gives a
+    short page without a cursor instead of a 500
+    """
+    import expenses
+    insert_test_multiple_expenses(4)
+    with client.session_transaction() as sess:
+        sess['user_id'] = insert_test_user
+
+    real_get_user_expenses_json = expenses.get_user_expenses_json
+
+    def racing_get_user_expenses_json(**kwargs):
+        # COUNT sees all 4 rows, then a DELETE lands before the page query
+        totals = real_get_user_expenses_json(**kwargs)
+        test_db.execute("DELETE FROM expenses WHERE amount >= 102")
+        page = real_get_user_expenses_json(**kwargs, include_total=False)
+        return {**page, **{key: totals[key] for key in ('total_count', 'total_expenses_sum', 'total_income_sum')}}
+
+    monkeypatch.setattr(expenses, 'get_user_expenses_json', racing_get_user_expenses_json)
+
+    response = client.get('/expenses?sort_by=amount&per_page=3')
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert [e['amount'] for e in body['expenses']] == [101, 100]
+    assert body['pagination']['next_cursor'] is None
@@ -1,6 +1,43 @@
 # utils.py
-from functools import wraps
-from flask import session, jsonify
+from functools import wraps, lru_cache
+from flask import session, current_app
+from flask.json.provider import JSONProvider
+import orjson
+
+
+@lru_cache(maxsize=128)
+def _error_body(message):
+    return orjson.dumps({"error": message})
+
+
+def error_response(message, status):
+    """
+    Build a JSON error response, serializing each distinct message only once
+    
+    Usage:
+        return error_response("Invalid JSON", 400)
+    
+    A fresh Response is built every call since Flask mutates responses
+    afterwards (session cookie, Vary header), only the body is shared.
+    """
+    return current_app.response_class(_error_body(message), status=status, mimetype="application/json")
+
+
+def raw_json_response(raw, payload, status=200):
+    """
+    Build a JSON object response that embeds already-encoded JSON values
+    
+    Usage:
+        return raw_json_response({"expenses": expenses_json}, {"pagination": pagination})
+    
+    :param raw: Dict of key -> JSON text (e.g. built by SQLite), inserted as is
+    :param payload: Dict of key -> value, serialized with orjson
+    :param status: HTTP status code
+    """
+    parts = [orjson.dumps(key) + b":" + value.encode("utf-8") for key, value in raw.items()]
+    parts.extend(orjson.dumps(key) + b":" + orjson.dumps(value) for key, value in payload.items())
+    return current_app.response_class(b"{" + b",".join(parts) + b"}", status=status, mimetype="application/json")
+
 
 def login_required(f):
     """
@@ -18,6 +55,25 @@ def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            return jsonify({"error": "Authentication required"}), 401
+            return error_response("Authentication required", 401)
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider backed by orjson, faster than the stdlib json module
+
+    Usage:
+        app.json = OrjsonProvider(app)
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the base implementation
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")